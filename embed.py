@@ -1,17 +1,52 @@
+import functools
+import io
+import mmap
 import os
-import tempfile
-from mutagen.wave import WAVE
+import shutil
+import struct
 from mutagen.id3 import ID3, TIT2, TPE1, TALB, TBPM, TKEY, TCOM, TPUB, COMM
 
+# RIFF chunk header (4-byte ID + little-endian size) and a bare little-endian size.
+_CHUNK_HEADER = struct.Struct("<4sI")
+_U32 = struct.Struct("<I")
+
+# Chunk IDs used for ID3 tags inside a WAV file; existing ones are replaced.
+_ID3_CHUNK_IDS = (b"id3 ", b"ID3 ")
+
+
+def _make_chunk(chunk_id, data):
+    """Build a RIFF chunk: ID + (4-byte size) + data, padded to an even length."""
+    chunk = _CHUNK_HEADER.pack(chunk_id, len(data)) + data
+    if len(data) % 2 == 1:
+        chunk += b"\x00"
+    return chunk
+
+
+def _present_fields(metadata_dict):
+    """Drop metadata fields whose value is missing or blank."""
+    return {k: v for k, v in metadata_dict.items() if v is not None and str(v).strip()}
+
+
+def _build_comments(metadata_dict):
+    comments = []
+    if "BPM" in metadata_dict:
+        comments.append(f"BPM: {metadata_dict['BPM']}")
+    if "Key" in metadata_dict:
+        comments.append(f"Key: {metadata_dict['Key']}")
+    if "Publishers" in metadata_dict:
+        comments.append(f"Publishers: {metadata_dict['Publishers']}")
+    return comments
+
+
+def _build_list_chunk(metadata_dict):
+    metadata_dict = _present_fields(metadata_dict)
 
-def add_riff_metadata(input_wav_path, output_wav_path, metadata_dict):
     def encode_riff_info(tag, value):
         value_bytes = value.encode("utf-8")
         # Pad with null byte if odd length
         if len(value_bytes) % 2 == 1:
             value_bytes += b'\x00'
-        size = len(value_bytes)
-        return tag.encode("ascii") + size.to_bytes(4, "little") + value_bytes
+        return _CHUNK_HEADER.pack(tag.encode("ascii"), len(value_bytes)) + value_bytes
 
     # Build RIFF metadata bytes
     metadata_bytes = b""
@@ -21,110 +56,120 @@ def add_riff_metadata(input_wav_path, output_wav_path, metadata_dict):
         metadata_bytes += encode_riff_info("IART", metadata_dict["Composers"])
     if "Source Program" in metadata_dict:
         metadata_bytes += encode_riff_info("IPRD", metadata_dict["Source Program"])
-    comments = []
-    if "BPM" in metadata_dict:
-        comments.append(f"BPM: {metadata_dict['BPM']}")
-    if "Key" in metadata_dict:
-        comments.append(f"Key: {metadata_dict['Key']}")
-    if "Publishers" in metadata_dict:
-        comments.append(f"Publishers: {metadata_dict['Publishers']}")
+    comments = _build_comments(metadata_dict)
     if comments:
         comment_str = " | ".join(comments)
         metadata_bytes += encode_riff_info("ICMT", comment_str)
 
+    # Nothing to embed: no LIST chunk.
+    if not metadata_bytes:
+        return b""
+
     # Create LIST chunk: "LIST" + (4-byte size) + "INFO" + metadata
-    list_chunk_data = b"INFO" + metadata_bytes
-    list_chunk_size = len(list_chunk_data)
-    list_chunk = b"LIST" + list_chunk_size.to_bytes(4, "little") + list_chunk_data
-
-    # Read the original WAV data.
-    with open(input_wav_path, "rb") as f:
-        wav_data = f.read()
-
-    # Verify that the file is a valid WAV file.
-    if wav_data[0:4] != b"RIFF" or wav_data[8:12] != b"WAVE":
-        raise RuntimeError("Not a valid WAV file.")
-
-    # Locate the end of the "fmt " chunk.
-    pos = 12
-    fmt_end = None
-    while pos + 8 <= len(wav_data):
-        chunk_id = wav_data[pos:pos + 4]
-        chunk_size = int.from_bytes(wav_data[pos + 4:pos + 8], "little")
-        if chunk_id == b"fmt ":
-            fmt_end = pos + 8 + chunk_size
-            break
-        pos += 8 + chunk_size
-    if fmt_end is None:
-        raise RuntimeError("No 'fmt ' chunk found.")
-
-    # Insert the LIST chunk right after the "fmt " chunk.
-    new_wav_data = wav_data[:fmt_end] + list_chunk + wav_data[fmt_end:]
-
-    with open(output_wav_path, "wb") as f:
-        f.write(new_wav_data)
-
-
-def add_id3_metadata(wav_path, metadata_dict):
-    audio = WAVE(wav_path)
-    if not audio.tags:
-        audio.add_tags()
-    audio.tags.clear()
+    return _make_chunk(b"LIST", b"INFO" + metadata_bytes)
+
+
+def _build_id3_chunk(metadata_dict):
+    # Files often share identical tags, so serialize each distinct tag set only once.
+    return _build_id3_chunk_cached(tuple(sorted(_present_fields(metadata_dict).items())))
+
+
+@functools.lru_cache(maxsize=256)
+def _build_id3_chunk_cached(frozen_items):
+    metadata_dict = dict(frozen_items)
+    # Nothing to embed: no id3 chunk.
+    if not metadata_dict:
+        return b""
+
+    tags = ID3()
 
     if "Track Title" in metadata_dict:
-        audio.tags.add(TIT2(encoding=3, text=metadata_dict["Track Title"]))
+        tags.add(TIT2(encoding=3, text=metadata_dict["Track Title"]))
     if "Composers" in metadata_dict:
-        audio.tags.add(TPE1(encoding=3, text=metadata_dict["Composers"]))
+        tags.add(TPE1(encoding=3, text=metadata_dict["Composers"]))
     if "Source Program" in metadata_dict:
-        audio.tags.add(TALB(encoding=3, text=metadata_dict["Source Program"]))
+        tags.add(TALB(encoding=3, text=metadata_dict["Source Program"]))
     if "BPM" in metadata_dict:
-        audio.tags.add(TBPM(encoding=3, text=str(metadata_dict["BPM"])))
+        tags.add(TBPM(encoding=3, text=str(metadata_dict["BPM"])))
     if "Key" in metadata_dict:
-        audio.tags.add(TKEY(encoding=3, text=metadata_dict["Key"]))
+        tags.add(TKEY(encoding=3, text=metadata_dict["Key"]))
 
-    comments = []
-    if "BPM" in metadata_dict:
-        comments.append(f"BPM: {metadata_dict['BPM']}")
-    if "Key" in metadata_dict:
-        comments.append(f"Key: {metadata_dict['Key']}")
-    if "Publishers" in metadata_dict:
-        comments.append(f"Publishers: {metadata_dict['Publishers']}")
+    comments = _build_comments(metadata_dict)
     if comments:
-        audio.tags.add(COMM(encoding=3, lang="eng", desc="Description", text=" | ".join(comments)))
+        tags.add(COMM(encoding=3, lang="eng", desc="Description", text=" | ".join(comments)))
 
     if "Composers" in metadata_dict:
         for composer in metadata_dict["Composers"].split(","):
-            audio.tags.add(TCOM(encoding=3, text=composer.strip()))
+            tags.add(TCOM(encoding=3, text=composer.strip()))
     if "Publishers" in metadata_dict:
         for publisher in metadata_dict["Publishers"].split(","):
-            audio.tags.add(TPUB(encoding=3, text=publisher.strip()))
-
-    audio.save()
-
-
-def embed_metadata(uploaded_file, metadata_dict, output_filename):
-    # Write uploaded file to a temporary WAV file.
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_in:
-        temp_in.write(uploaded_file.getbuffer())
-        temp_in_path = temp_in.name
-
-    # Insert RIFF metadata.
-    temp_riff_path = tempfile.NamedTemporaryFile(delete=False, suffix=".wav").name
-    add_riff_metadata(temp_in_path, temp_riff_path, metadata_dict)
-
-    # Copy to a temporary file for adding ID3 metadata.
-    temp_final_path = tempfile.NamedTemporaryFile(delete=False, suffix=".wav").name
-    with open(temp_riff_path, "rb") as f_in, open(temp_final_path, "wb") as f_out:
-        f_out.write(f_in.read())
-
-    add_id3_metadata(temp_final_path, metadata_dict)
-
-    os.remove(temp_in_path)
-    os.remove(temp_riff_path)
-
-    # Move final file to a new temporary directory with the desired output filename.
-    output_dir = tempfile.mkdtemp()
-    final_output_path = os.path.join(output_dir, output_filename)
-    os.rename(temp_final_path, final_output_path)
-    return final_output_path
-
+            tags.add(TPUB(encoding=3, text=publisher.strip()))
+
+    # Serialize the ID3v2.4 tag in memory, the same way mutagen does when saving a WAVE file.
+    tag_data = tags._prepare_data(io.BytesIO(), 0, 0, 4, "/", None)
+    return _make_chunk(b"id3 ", tag_data)
+
+
+def _write_wav_with_chunks(input_wav_path, output_wav_path, new_chunks, drop_chunk_ids=()):
+    """Stream a WAV file to a new path, inserting ``new_chunks`` right after the "fmt " chunk.
+
+    Chunks whose ID is in ``drop_chunk_ids`` are left out of the output.
+    """
+    with open(input_wav_path, "rb") as f_in:
+        # Verify that the file is a valid WAV file.
+        if os.fstat(f_in.fileno()).st_size < 12:
+            raise RuntimeError("Not a valid WAV file.")
+
+        # Map the input so chunks are written straight from the page cache.
+        with mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as wav_data, \
+                open(output_wav_path, "wb") as f_out:
+            if wav_data[0:4] != b"RIFF" or wav_data[8:12] != b"WAVE":
+                raise RuntimeError("Not a valid WAV file.")
+
+            with memoryview(wav_data) as view:
+                f_out.write(view[:12])
+
+                pos = 12
+                found_fmt = False
+                while pos + 8 <= len(wav_data):
+                    chunk_id, chunk_size = _CHUNK_HEADER.unpack_from(wav_data, pos)
+                    chunk_end = min(pos + 8 + chunk_size + (chunk_size & 1), len(wav_data))
+
+                    if chunk_id not in drop_chunk_ids:
+                        f_out.write(view[pos:chunk_end])
+                        if chunk_id == b"fmt " and not found_fmt:
+                            found_fmt = True
+                            for chunk in new_chunks:
+                                f_out.write(chunk)
+                    pos = chunk_end
+
+                if not found_fmt:
+                    raise RuntimeError("No 'fmt ' chunk found.")
+
+                # Keep any trailing bytes that do not form a full chunk header.
+                f_out.write(view[pos:])
+
+            # Rewrite the RIFF size to account for inserted and dropped chunks.
+            riff_size = f_out.tell() - 8
+            f_out.seek(4)
+            f_out.write(_U32.pack(riff_size))
+
+
+def embed_metadata(input_path, metadata_dict, output_path):
+    # Insert both the RIFF LIST chunk and the ID3 chunk in a single pass, writing to a
+    # sibling temp file first so output_path may be the input itself.
+    new_chunks = [chunk for chunk in (_build_list_chunk(metadata_dict), _build_id3_chunk(metadata_dict)) if chunk]
+    if not new_chunks:
+        # Nothing to embed: leave the file untouched.
+        if os.path.abspath(input_path) != os.path.abspath(output_path):
+            shutil.copyfile(input_path, output_path)
+        return output_path
+
+    temp_path = output_path + ".tmp"
+    try:
+        _write_wav_with_chunks(input_path, temp_path, new_chunks, _ID3_CHUNK_IDS)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
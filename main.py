@@ -1,7 +1,6 @@
 import sys
 import os
 import zipfile
-import io
 
 # PyInstaller runtime fix
 if getattr(sys, 'frozen', False):
@@ -11,14 +10,24 @@ if getattr(sys, 'frozen', False):
 import streamlit as st
 import os
 from pathlib import Path
+import shutil
 import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import ahocorasick
 import pandas as pd
 from metadata import parse_spreadsheet, TrackMetadata
 from embed import embed_metadata
 
+# Metadata fields embedded into each WAV file.
+METADATA_FIELDS = ["Track Title", "Source Program", "BPM", "Key", "Composers", "Publishers"]
+
 # Initialize session state for WAV files list
 if 'wav_files' not in st.session_state:
     st.session_state.wav_files = []
+    st.session_state.wav_files_sorted = False
+    # Bumped on every change to wav_files, so derived data is only rebuilt when needed
+    st.session_state.wav_files_gen = 0
 
 st.set_page_config(layout="wide")
 st.markdown("""
@@ -50,29 +59,110 @@ folder_path = st.text_input("Enter folder path containing WAV files", value="")
 
 
 
+def _mark_wav_files_changed():
+    """Marks the WAV files list for re-sorting and invalidates its cached DataFrame."""
+    st.session_state.wav_files_sorted = False
+    st.session_state.wav_files_gen += 1
+
+def _wav_file_entries(wav_files):
+    """Counts the entries of a WAV files list regardless of their order."""
+    return Counter(tuple(file_info.items()) for file_info in wav_files)
+
+def _set_wav_files(wav_files):
+    """Replaces the WAV files list in session state if its entries have changed."""
+    # The stored list is kept sorted by title, so compare entries regardless of order;
+    # an unchanged list keeps its current (already sorted) order.
+    if _wav_file_entries(wav_files) == _wav_file_entries(st.session_state.wav_files):
+        return
+    st.session_state.wav_files = wav_files
+    _mark_wav_files_changed()
+
+def _track_title_sort_key(file_info):
+    """Sorts by Track Title, case-insensitively, with untitled files last."""
+    return file_info["Track Title"].lower() if file_info["Track Title"] else "zzzzz"
+
+def _make_entry(file_path, filename):
+    """Builds a WAV file entry with empty metadata."""
+    return {
+        "File Path": file_path,
+        "Uploaded Audio": filename,  # used for display and matching metadata
+        "Filename From Data": "",
+        "Track Title": "",
+        "Source Program": "",
+        "BPM": "",
+        "Key": "",
+        "Composers": "",
+        "Publishers": ""
+    }
+
+def _iter_wav_entries(folder):
+    """Recursively yields (path, name) for every WAV file below a folder."""
+    try:
+        it = os.scandir(folder)
+    except OSError:
+        # Like os.walk, skip directories that cannot be read
+        return
+    with it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # Like os.walk, don't descend into symlinked directories
+                if not entry.is_symlink():
+                    yield from _iter_wav_entries(entry.path)
+            elif entry.name.lower().endswith('.wav'):
+                yield entry.path, entry.name
+
 def get_wav_files_from_folder(folder):
     """Recursively gathers all WAV files from a folder and returns a list of dictionaries."""
-    wav_files = []
-    for root, _, files in os.walk(folder):
-        for file in files:
-            if file.lower().endswith('.wav'):
-                wav_files.append({
-                    "File Path": os.path.join(root, file),
-                    "Uploaded Audio": file,  # used for display and matching metadata
-                    "Filename From Data": "",
-                    "Track Title": "",
-                    "Source Program": "",
-                    "BPM": "",
-                    "Key": "",
-                    "Composers": "",
-                    "Publishers": ""
-                })
-    return sorted(wav_files, key=lambda x: x["Uploaded Audio"])
+    return sorted((_make_entry(path, name) for path, name in _iter_wav_entries(folder)),
+                  key=lambda x: x["Uploaded Audio"])
+
+def _build_matcher(patterns):
+    """Builds an Aho-Corasick automaton mapping each pattern to the index of its first occurrence.
+
+    Returns the automaton and the index of the first empty pattern (which matches any text), if any.
+    """
+    automaton = ahocorasick.Automaton()
+    empty_idx = None
+    for idx, pattern in enumerate(patterns):
+        if not pattern:
+            if empty_idx is None:
+                empty_idx = idx
+        elif pattern not in automaton:
+            automaton.add_word(pattern, idx)
+    automaton.make_automaton()
+    return automaton, empty_idx
+
+def _first_match(matcher, text):
+    """Returns the lowest pattern index found in text, or None, like scanning the patterns in order."""
+    automaton, empty_idx = matcher
+    hits = [idx for _, idx in automaton.iter(text)] if len(automaton) else []
+    if empty_idx is not None:
+        hits.append(empty_idx)
+    return min(hits, default=None)
+
+@st.cache_data(show_spinner=False)
+def _cached_parse(data_bytes, suffix):
+    """Parses an uploaded data file, cached by its content so reruns skip the parse."""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp.write(data_bytes)
+        tmp_path = tmp.name
+    try:
+        return parse_spreadsheet(tmp_path)
+    finally:
+        os.unlink(tmp_path)
+
+# Build this run's WAV files list locally and store it once at the end, so session
+# state only changes when the resulting list does.
+wav_files = list(st.session_state.wav_files)
 
-# When a valid folder is provided, update the session state.
+# When a valid folder is provided, rescan it.
 # Process files from folder path
 if folder_path and os.path.isdir(folder_path):
-    st.session_state.wav_files = get_wav_files_from_folder(folder_path)
+    wav_files = get_wav_files_from_folder(folder_path)
 
 # Process uploaded files
 if uploaded_files:
@@ -84,36 +174,26 @@ if uploaded_files:
     for uploaded_file in uploaded_files:
         # Save file to temp directory
         temp_file_path = os.path.join(st.session_state.temp_dir, uploaded_file.name)
+        uploaded_file.seek(0)
         with open(temp_file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+            shutil.copyfileobj(uploaded_file, f)
 
-        # Add to session state if not already there
-        file_exists = any(file_info["File Path"] == temp_file_path for file_info in st.session_state.wav_files)
+        # Add to the list if not already there
+        file_exists = any(file_info["File Path"] == temp_file_path for file_info in wav_files)
         if not file_exists:
-            st.session_state.wav_files.append({
-                "File Path": temp_file_path,
-                "Uploaded Audio": uploaded_file.name,
-                "Filename From Data": "",
-                "Track Title": "",
-                "Source Program": "",
-                "BPM": "",
-                "Key": "",
-                "Composers": "",
-                "Publishers": ""
-            })
+            wav_files.append(_make_entry(temp_file_path, uploaded_file.name))
 
 # Process metadata if data file is uploaded and we have WAV files.
-if data_file is not None and st.session_state.wav_files:
+if data_file is not None and wav_files:
     try:
-        import tempfile
-        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(data_file.name)[1], delete=False) as tmp:
-            tmp.write(data_file.getvalue())
-            tmp_path = tmp.name
+        metadata_list = _cached_parse(data_file.getvalue(), os.path.splitext(data_file.name)[1])
 
-        metadata_list = parse_spreadsheet(tmp_path)
+        # Match every file against all patterns in a single scan per filename.
+        title_matcher = _build_matcher(f"{m.track_title.lower()}_" for m in metadata_list)
+        filename_matcher = _build_matcher(m.filename_from_data.lower() for m in metadata_list)
 
         updated_files = []
-        for file_info in st.session_state.wav_files:
+        for file_info in wav_files:
             new_entry = file_info.copy()
             audio_filename = file_info["Uploaded Audio"].lower()
 
@@ -128,44 +208,51 @@ if data_file is not None and st.session_state.wav_files:
             })
 
             # Find metadata by pattern
-            for m in metadata_list:
-                pattern = f"{m.track_title.lower()}_"
-                if pattern in audio_filename:
-                    new_entry.update({
-                        "Track Title": m.track_title,
-                        "Source Program": m.source_program,
-                        "BPM": m.bpm,
-                        "Key": m.key,
-                        "Composers": ", ".join(m.writers),
-                        "Publishers": ", ".join(m.publishers)
-                    })
-                    break
+            idx = _first_match(title_matcher, audio_filename)
+            if idx is not None:
+                m = metadata_list[idx]
+                new_entry.update({
+                    "Track Title": m.track_title,
+                    "Source Program": m.source_program,
+                    "BPM": m.bpm,
+                    "Key": m.key,
+                    "Composers": ", ".join(m.writers),
+                    "Publishers": ", ".join(m.publishers)
+                })
 
             # Check for filename match
-            for m in metadata_list:
-                if m.filename_from_data.lower() in audio_filename:
-                    new_entry["Filename From Data"] = m.filename_from_data
-                    break
+            idx = _first_match(filename_matcher, audio_filename)
+            if idx is not None:
+                new_entry["Filename From Data"] = metadata_list[idx].filename_from_data
 
             updated_files.append(new_entry)
-        st.session_state.wav_files = updated_files
+        wav_files = updated_files
 
     except Exception as e:
         st.error(f"Error parsing data file: {str(e)}")
-    finally:
-        if 'tmp_path' in locals() and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+
+_set_wav_files(wav_files)
 
 # Display table with metadata for editing.
 if st.session_state.wav_files:
     st.subheader("Metadata")
-    # Sort the files by Track Title
-    st.session_state.wav_files = sorted(st.session_state.wav_files, key=lambda x: x["Track Title"].lower() if x["Track Title"] else "zzzzz")
-
-    df = pd.DataFrame(st.session_state.wav_files)
-    df.insert(0, "No.", range(1, len(df) + 1))
-
-    # Create editable DataFrame with dynamic height and row highlighting
+    # Sort the files by Track Title, only when the list has changed
+    if not st.session_state.wav_files_sorted:
+        st.session_state.wav_files.sort(key=_track_title_sort_key)
+        st.session_state.wav_files_sorted = True
+
+    # Rebuild the DataFrame only when the list has changed since it was last built
+    if st.session_state.get("wav_df_gen") != st.session_state.wav_files_gen:
+        df = pd.DataFrame(st.session_state.wav_files)
+        df.insert(0, "No.", range(1, len(df) + 1))
+        # Flag rows with any empty metadata field
+        fields = df[METADATA_FIELDS]
+        df.insert(1, "Missing", (fields.isna() | (fields == "")).any(axis=1))
+        st.session_state.wav_df = df
+        st.session_state.wav_df_gen = st.session_state.wav_files_gen
+    df = st.session_state.wav_df
+
+    # Create editable DataFrame with dynamic height and a read-only missing-metadata flag
     edited_df = st.data_editor(
         df,
         key="wav_editor",
@@ -174,31 +261,19 @@ if st.session_state.wav_files:
         num_rows="dynamic",
         column_config={
             "_index": None,  # Hide index
-            "No.": None  # Hide number column header
+            "No.": None,  # Hide number column header
+            "Missing": st.column_config.CheckboxColumn(
+                "Missing",
+                help="Some metadata fields are empty",
+                disabled=True
+            )
         }
     )
 
     # Update session state with edited data
     if not edited_df.equals(df):
-        updated_data = edited_df.drop(columns=['No.']).to_dict('records')
-        st.session_state.wav_files = updated_data
-
-
-    # JavaScript for dynamic row highlighting
-    st.components.v1.html(f"""
-    <script>
-    const rows = parent.document.querySelectorAll('[data-testid="stDataFrame"] tbody tr');
-    rows.forEach(row => {{
-        const filename = row.children[2].textContent.trim();
-        const metadataCells = Array.from(row.children).slice(3, 9);
-        const missingFields = metadataCells.some(td => td.textContent.trim() === '');
-
-        if (missingFields) {{
-            row.style.backgroundColor = '#fff3cd';  # Light yellow highlight
-        }}
-    }});
-    </script>
-    """, height=0, width=0)
+        updated_data = edited_df.drop(columns=['No.', 'Missing']).to_dict('records')
+        _set_wav_files(updated_data)
 
 # Update the CSS to handle highlighting
 st.markdown("""
@@ -214,14 +289,23 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Dummy File Wrapper to simulate uploaded file behavior.
-class FileWrapper:
-    def __init__(self, file_path):
-        self.file_path = file_path
-        with open(file_path, "rb") as f:
-            self.data = f.read()
-    def getbuffer(self):
-        return self.data
+def _process_one(file_info):
+    """Embeds metadata into a single WAV file in place; returns an error message or None."""
+    original_path = file_info["File Path"]
+    metadata_dict = {k: file_info[k] for k in METADATA_FIELDS}
+    # Skip files without any metadata to embed.
+    if not any(v is not None and str(v).strip() for v in metadata_dict.values()):
+        return None
+    try:
+        # Process file using embed_metadata, overwriting the original file.
+        embed_metadata(
+            input_path=original_path,
+            metadata_dict=metadata_dict,
+            output_path=original_path
+        )
+    except Exception as e:
+        return f"{original_path}: {str(e)}"
+    return None
 
 # Action buttons.
 col1, col2 = st.columns(2)
@@ -235,25 +319,9 @@ if embed_btn:
         st.warning("No WAV files to process.")
     else:
         with st.spinner("Embedding metadata..."):
-            errors = []
-            for file_info in st.session_state.wav_files:
-                original_path = file_info["File Path"]
-                file_wrapper = FileWrapper(original_path)
-                try:
-                    # Process file using embed_metadata.
-                    final_path = embed_metadata(
-                        uploaded_file=file_wrapper,
-                        metadata_dict={k: file_info[k] for k in ["Track Title", "Source Program", "BPM", "Key", "Composers", "Publishers"]},
-                        output_filename=os.path.basename(original_path)
-                    )
-                    # Overwrite original file with processed data.
-                    with open(final_path, "rb") as f_final:
-                        processed_data = f_final.read()
-                    with open(original_path, "wb") as f_original:
-                        f_original.write(processed_data)
-                    os.unlink(final_path)
-                except Exception as e:
-                    errors.append(f"{original_path}: {str(e)}")
+            # Files are independent, so embed them concurrently.
+            with ThreadPoolExecutor(max_workers=min(os.cpu_count() or 1, 8)) as executor:
+                errors = [err for err in executor.map(_process_one, st.session_state.wav_files) if err]
             if errors:
                 st.error("Errors occurred during processing:")
                 for error in errors:
@@ -269,9 +337,10 @@ if uploaded_files and st.session_state.get('embedding_completed', False):
 
     with download_container:
         with st.spinner("Creating download package..."):
-            # Create a zip file in memory
-            zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            # Create the zip file on disk next to the uploaded files; WAV audio barely
+            # compresses, so store the files without DEFLATE
+            zip_path = os.path.join(st.session_state.temp_dir, "processed_wav_files.zip")
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zip_file:
                 total_size = 0
                 for file_info in st.session_state.wav_files:
                     file_path = file_info["File Path"]
@@ -281,8 +350,6 @@ if uploaded_files and st.session_state.get('embedding_completed', False):
                     total_size += file_size
                     zip_file.write(file_path, filename)
 
-            zip_buffer.seek(0)
-
             # Show success message with file size info
             st.success(
                 f"✅ Download package ready! Contains {len(st.session_state.wav_files)} files ({total_size / 1024 / 1024:.1f} MB)")
@@ -300,10 +367,11 @@ if uploaded_files and st.session_state.get('embedding_completed', False):
             </style>
         """, unsafe_allow_html=True)
 
-        st.download_button(
-            label="⬇️ DOWNLOAD PROCESSED FILES",
-            data=zip_buffer,
-            file_name="processed_wav_files.zip",
-            mime="application/zip",
-            type="primary"
-        )
\ No newline at end of file
+        with open(zip_path, "rb") as zip_file:
+            st.download_button(
+                label="⬇️ DOWNLOAD PROCESSED FILES",
+                data=zip_file,
+                file_name="processed_wav_files.zip",
+                mime="application/zip",
+                type="primary"
+            )
\ No newline at end of file
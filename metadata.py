@@ -1,10 +1,30 @@
 import csv
+import logging
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import List
+import pandas as pd
 from openpyxl import load_workbook
 import tempfile
 import os
 
+logger = logging.getLogger(__name__)
+
+# Spreadsheet columns used by the parsers: filename, title, source program, BPM, key,
+# followed by five 10-column writer/publisher blocks starting at column 12
+_NEEDED_COLUMNS = [0, 1, 2, 4, 5, *range(12, 62)]
+# Rows narrower than this are skipped
+_MIN_COLUMNS = 34
+# Offsets of the 5 writer (first, middle, last, PRO, CAE, share) and 5 publisher
+# (name, PRO, CAE, share) column groups within a projected row, 10 columns apart
+_WRITER_OFFSETS = [
+    tuple(_NEEDED_COLUMNS.index(12 + i * 10) + j for j in range(6)) for i in range(5)
+]
+_PUBLISHER_OFFSETS = [
+    tuple(_NEEDED_COLUMNS.index(18 + i * 10) + j for j in range(4)) for i in range(5)
+]
+# First and last spreadsheet column of every writer and publisher group
+_GROUP_BOUNDS = [(12 + i * 10, 17 + i * 10) for i in range(5)] + [(18 + i * 10, 21 + i * 10) for i in range(5)]
+
 
 @dataclass
 class TrackMetadata:
@@ -29,174 +49,148 @@ def parse_spreadsheet(file_path: str) -> List[TrackMetadata]:
 def _parse_excel(file_path: str) -> List[TrackMetadata]:
     """Parse metadata from XLSX files"""
     metadata_list = []
-    print(f"\n{'=' * 40}\nParsing Excel file: {file_path}\n{'=' * 40}")
 
     try:
         wb = load_workbook(filename=file_path, read_only=True, data_only=True)
-
-        for sheet_name in wb.sheetnames:
-            print(f"\nProcessing sheet: {sheet_name}")
-            sheet = wb[sheet_name]
-            for row_idx, row in enumerate(sheet.iter_rows(values_only=True), 1):
-                if len(row) < 34:
-                    print(f"Skipping row {row_idx} - insufficient columns")
-                    continue
-
-                metadata = TrackMetadata(
-                    filename_from_data=_safe_get(row, 0),
-                    track_title=_safe_get(row, 1),
-                    source_program=_safe_get(row, 2),
-                    bpm=_safe_get(row, 4),
-                    key=_safe_get(row, 5),
-                    writers=_parse_writers(row, 12),
-                    publishers=_parse_publishers(row, 18)
-                )
-
-                # Print to console
-                print(f"\nTrack #{len(metadata_list) + 1}")
-                print(f"File Name From Data: {metadata.filename_from_data}")
-                print(f"Track Title: {metadata.track_title}")
-                print(f"Source Program: {metadata.source_program}")
-                print(f"BPM: {metadata.bpm} | Key: {metadata.key}")
-                print(f"Writers: {', '.join(metadata.writers) or 'None'}")
-                print(f"Publishers: {', '.join(metadata.publishers) or 'None'}")
-
-                metadata_list.append(metadata)
+        try:
+            for sheet_name in wb.sheetnames:
+                sheet = wb[sheet_name]
+                # Rows span the sheet's dimensions when it records them, else their own cells
+                width = sheet.max_column
+                max_col = min(width, _NEEDED_COLUMNS[-1] + 1) if width else None
+                # Keep error cells such as '#N/A' as text, like any other value
+                rows = [
+                    ['' if value is None else str(value) for value in row[:_NEEDED_COLUMNS[-1] + 1]]
+                    for row in sheet.iter_rows(values_only=True, max_col=max_col)
+                    if len(row) >= _MIN_COLUMNS
+                ]
+                metadata_list.extend(_parse_rows(_frame(rows)))
+        finally:
+            wb.close()
 
     except Exception as e:
         raise ValueError(f"Error parsing Excel file: {str(e)}") from e
 
-    print(f"\n{'=' * 40}")
-    print(f"Total tracks parsed from Excel: {len(metadata_list)}")
-    print(f"{'=' * 40}\n")
+    logger.debug("Parsed %d tracks from Excel file %s", len(metadata_list), file_path)
     return metadata_list
 
 
 def _parse_csv(file_path: str) -> List[TrackMetadata]:
     """Parse metadata from CSV files"""
     metadata_list = []
-    print(f"\n{'=' * 40}\nParsing CSV file: {file_path}\n{'=' * 40}")
 
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             reader = csv.reader(f)
             next(reader)  # Skip header row
+            # Rows narrower than _MIN_COLUMNS are skipped; columns past the last needed one are dropped
+            rows = [row[:_NEEDED_COLUMNS[-1] + 1] for row in reader if len(row) >= _MIN_COLUMNS]
 
-            for row_idx, row in enumerate(reader, 1):
-                if len(row) < 34:
-                    print(f"Skipping row {row_idx} - insufficient columns")
-                    continue
-
-                metadata = TrackMetadata(
-                    filename_from_data=_safe_get(row, 0),
-                    track_title=_safe_get(row, 1),
-                    source_program=_safe_get(row, 2),
-                    bpm=_safe_get(row, 4),
-                    key=_safe_get(row, 5),
-                    writers=_parse_writers(row, 12),
-                    publishers=_parse_publishers(row, 18)
-                )
-
-                # Print to console
-                print(f"\nTrack #{len(metadata_list) + 1}")
-                print(f"File Name From Data: {metadata.filename_from_data}")
-                print(f"Track Title: {metadata.track_title}")
-                print(f"Source Program: {metadata.source_program}")
-                print(f"BPM: {metadata.bpm} | Key: {metadata.key}")
-                print(f"Writers: {', '.join(metadata.writers) or 'None'}")
-                print(f"Publishers: {', '.join(metadata.publishers) or 'None'}")
-
-                metadata_list.append(metadata)
+        metadata_list.extend(_parse_rows(_frame(rows)))
 
     except Exception as e:
         raise ValueError(f"Error parsing CSV file: {str(e)}") from e
 
-    print(f"\n{'=' * 40}")
-    print(f"Total tracks parsed from CSV: {len(metadata_list)}")
-    print(f"{'=' * 40}\n")
+    logger.debug("Parsed %d tracks from CSV file %s", len(metadata_list), file_path)
     return metadata_list
 
 
-def _parse_writers(row: list, start_idx: int) -> List[str]:
-    """Parse writer information from row data"""
-    writers = []
-    for i in range(5):  # Max 5 writers
-        offset = start_idx + (i * 10)  # 10 columns between writer groups
-        if offset + 5 >= len(row):
+def _frame(rows: List[List[str]]) -> pd.DataFrame:
+    """Build a projected frame from rows of strings of possibly different lengths"""
+    # Shorter rows are padded with None; ignore writer/publisher groups that run past a row's end
+    df = pd.DataFrame(rows)
+    for first, last in _GROUP_BOUNDS:
+        if last < df.shape[1]:
+            df.loc[df[last].isna(), first:last] = ''
+    return _project(df, df.shape[1])
+
+
+def _project(df: pd.DataFrame, width: int) -> pd.DataFrame:
+    """Lay out the needed columns that fit in ``width`` contiguously, filling gaps with ''"""
+    columns = [c for c in _NEEDED_COLUMNS if c < width]
+    return df.reindex(columns=columns).fillna('')
+
+
+def _parse_rows(df: pd.DataFrame) -> List[TrackMetadata]:
+    """Build track metadata from rows projected onto _NEEDED_COLUMNS"""
+    if df.empty:
+        return []
+
+    return [
+        TrackMetadata(
+            filename_from_data=_safe_get(row, 0),
+            track_title=_safe_get(row, 1),
+            source_program=_safe_get(row, 2),
+            bpm=_safe_get(row, 3),
+            key=_safe_get(row, 4),
+            writers=writers,
+            publishers=publishers
+        )
+        for row, writers, publishers in zip(
+            df.itertuples(index=False, name=None), _format_writers(df), _format_publishers(df)
+        )
+    ]
+
+
+def _format_writers(df: pd.DataFrame) -> List[List[str]]:
+    """Format every row's writer groups into standardized strings"""
+    slots = []
+    for offsets in _WRITER_OFFSETS:
+        if offsets[-1] >= df.shape[1]:
             break
 
-        writer = _format_writer(
-            first=_safe_get(row, offset),
-            middle=_safe_get(row, offset + 1),
-            last=_safe_get(row, offset + 2),
-            pro=_safe_get(row, offset + 3),
-            cae=_safe_get(row, offset + 4),
-            share=_safe_get(row, offset + 5)
-        )
-        if writer:
-            writers.append(writer)
+        first, middle, last, pro, cae, share = (_column(df, i) for i in offsets)
+        name = _join_nonempty([first, middle, last])
+        writer = _join_nonempty([name, _wrap(pro, '(', ')'), _wrap(cae, '[', ']'), _wrap(share, '', '%')])
+        slots.append(writer.where(name != '', ''))
+
+    return _collect_slots(slots, len(df))
 
-    return writers
 
-def _parse_publishers(row: list, start_idx: int) -> List[str]:
-    """Parse publisher information from row data"""
-    publishers = []
-    for i in range(5):  # Max 5 publishers
-        offset = start_idx + (i * 10)  # CHANGED to 10-column spacing
-        if offset + 3 >= len(row):
+def _format_publishers(df: pd.DataFrame) -> List[List[str]]:
+    """Format every row's publisher groups into standardized strings"""
+    slots = []
+    for offsets in _PUBLISHER_OFFSETS:
+        if offsets[-1] >= df.shape[1]:
             break
 
-        publisher = _format_publisher(
-            name=_safe_get(row, offset),
-            pro=_safe_get(row, offset + 1),
-            cae=_safe_get(row, offset + 2),
-            share=_safe_get(row, offset + 3)
-        )
-        if publisher:
-            publishers.append(publisher)
+        name, pro, cae, share = (_column(df, i) for i in offsets)
+        publisher = _join_nonempty([name, _wrap(pro, '(', ')'), _wrap(cae, '[', ']'), _wrap(share, '', '%')])
+        slots.append(publisher.where(name != '', ''))
 
-    return publishers
+    return _collect_slots(slots, len(df))
 
 
-def _format_writer(first: str, middle: str, last: str, pro: str, cae: str, share: str) -> Optional[str]:
-    """Format writer information into standardized string"""
-    if not any([first, middle, last]):
-        return None
+def _column(df: pd.DataFrame, index: int) -> pd.Series:
+    """Get a projected column as stripped strings"""
+    return df.iloc[:, index].astype(str).str.strip()
 
-    components = []
-    if first or middle or last:
-        name = ' '.join(filter(None, [first, middle, last]))
-        components.append(name.strip())
-    if pro:
-        components.append(f"({pro})")
-    if cae:
-        components.append(f"[{cae}]")
-    if share:
-        components.append(f"{share}%")
 
-    return ' '.join(components) if components else None
+def _wrap(values: pd.Series, prefix: str, suffix: str) -> pd.Series:
+    """Surround non-empty values with prefix and suffix"""
+    return (prefix + values + suffix).where(values != '', '')
 
 
-def _format_publisher(name: str, pro: str, cae: str, share: str) -> Optional[str]:
-    """Format publisher information into standardized string"""
-    if not name:
-        return None
+def _join_nonempty(parts: List[pd.Series]) -> pd.Series:
+    """Join the non-empty values of each row with single spaces"""
+    joined = parts[0]
+    for part in parts[1:]:
+        joined = joined.where(part == '', (joined + ' ').where(joined != '', '') + part)
+    return joined
 
-    components = [name]
-    if pro:
-        components.append(f"({pro})")
-    if cae:
-        components.append(f"[{cae}]")
-    if share:
-        components.append(f"{share}%")
 
-    return ' '.join(components) if components else None
+def _collect_slots(slots: List[pd.Series], row_count: int) -> List[List[str]]:
+    """Turn per-group columns into a list of non-empty entries per row"""
+    if not slots:
+        return [[] for _ in range(row_count)]
+    return [[value for value in values if value] for values in zip(*slots)]
 
 
 def _safe_get(row: list, index: int, default: str = '') -> str:
     """Safely get value from list with fallback"""
-    try:
-        value = row[index]
-        return str(value).strip() if value is not None else default
-    except (IndexError, TypeError):
-        return default
\ No newline at end of file
+    if index >= len(row):
+        return default
+    value = row[index]
+    if value is None:
+        return default
+    return value.strip() if isinstance(value, str) else str(value).strip()